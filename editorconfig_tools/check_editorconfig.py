@@ -2,6 +2,8 @@
 from __future__ import absolute_import, division, print_function
 
 import sys
+from functools import partial
+from multiprocessing import Pool
 from clint import arguments
 from clint.textui import puts, colored, indent
 from os.path import abspath
@@ -12,9 +14,10 @@ from editorconfig import get_properties, EditorConfigError
 
 COMMANDS = [
     ('--fix', "Fix EditorConfig file automatically."),
+    ('--jobs N', "Check files using N parallel processes."),
     ('--help', "Print this help message."),
 ]
-FLAGS = [flag for (flag, desc) in COMMANDS]
+FLAGS = [flag.split()[0] for (flag, desc) in COMMANDS]
 
 
 def usage():
@@ -26,8 +29,30 @@ def usage():
             puts('{0:20} {1}'.format(str(colored.blue(flag)), description))
 
 
+def check_file(filename, fix=False):
+    """Return list of error messages to print for given file"""
+    checker = EditorConfigChecker(fix=fix)
+    try:
+        props = get_properties(abspath(filename))
+    except EditorConfigError as e:
+        return [str(e)]
+    return ["%s: %s" % (filename, error)
+            for error in checker.check(filename, props)]
+
+
 def main():
     args = arguments.Args()
+    jobs = 1
+    if args.contains('--jobs'):
+        index = args.first('--jobs')
+        args.pop(index)
+        try:
+            jobs = int(args.pop(index))
+        except (TypeError, ValueError):
+            jobs = 0
+        if jobs < 1:
+            usage()
+            sys.exit(1)
     invalid_files = args.not_flags.not_files.all
     if any(f for f in args.flags.all if f not in FLAGS):
         usage()
@@ -40,16 +65,24 @@ def main():
         sys.exit(1)
     fix = args.contains(('-f', '--fix'))
 
-    for filename in args.files:
-        checker = EditorConfigChecker(fix=fix)
+    check = partial(check_file, fix=fix)
+    if jobs > 1:
+        pool = Pool(jobs)
         try:
-            props = get_properties(abspath(filename))
-        except EditorConfigError as e:
-            print(e)
-            continue
-        else:
-            for error in checker.check(filename, props):
-                print("%s: %s" % (filename, error))
+            print_messages(pool.imap(check, args.files))
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+    else:
+        print_messages(map(check, args.files))
+
+
+def print_messages(results):
+    """Print error messages of each checked file, in order"""
+    for messages in results:
+        for message in messages:
+            print(message)
 
 
 if __name__ == '__main__':
@@ -1,8 +1,50 @@
 from __future__ import absolute_import, division, print_function
-import sys
+import os
 import re
+import shutil
+import tempfile
+from collections import namedtuple
 
-PY3 = sys.version_info >= (3, 0, 0)
+_SPACE_INDENT_RE = re.compile(br'^(\s* \t+|^ +)')
+
+# Buffer size used when writing fixed files, instead of the 8 KiB default
+WRITE_BUFFER_SIZE = 128 * 1024
+
+# os.replace is Python 3.3+; os.rename also overwrites on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+# Bit flags for errors whose message doesn't depend on the file
+TAB_INDENTATION = 1 << 0
+SPACE_INDENTATION = 1 << 1
+TRAILING_WHITESPACE = 1 << 2
+FINAL_NEWLINE = 1 << 3
+NO_FINAL_NEWLINE = 1 << 4
+INCORRECT_INDENTATION = 1 << 5
+
+ERROR_MESSAGES = (
+    (TAB_INDENTATION, "Tab indentation found"),
+    (SPACE_INDENTATION, "Space indentation found"),
+    (TRAILING_WHITESPACE, "Trailing whitespace found"),
+    (FINAL_NEWLINE, "Final newline found"),
+    (NO_FINAL_NEWLINE, "No final newline found"),
+    (INCORRECT_INDENTATION,
+     "Over 30% of lines appear to be incorrectly indented"),
+)
+
+
+# Per-line check settings derived from a file's EditorConfig properties
+CheckSettings = namedtuple('CheckSettings', [
+    'end_of_line', 'newline', 'trim_whitespace', 'indent_style',
+    'check_indent_chars', 'count_indent', 'indent_size'])
+
+
+def _strip_newline(line):
+    """Return given line without its line ending, if any"""
+    if line.endswith(b'\r\n'):
+        return line[:-2]
+    elif line[-1:] in (b'\r', b'\n'):
+        return line[:-1]
+    return line
 
 
 class EditorConfigToolObject(object):
@@ -10,17 +52,17 @@ class EditorConfigToolObject(object):
     """Base class for EditorConfig tools"""
 
     byte_order_marks = {
-        '\xef\xbb\xbf': 'utf-8-bom',
-        '\xfe\xff': 'utf-16be',
-        '\xff\xfe': 'utf-16le',
-        '\x00\x00\xfe\xff': 'utf-32be',
-        '\xff\xfe\x00\x00': 'utf-32le',
+        b'\xef\xbb\xbf': 'utf-8-bom',
+        b'\xfe\xff': 'utf-16be',
+        b'\xff\xfe': 'utf-16le',
+        b'\x00\x00\xfe\xff': 'utf-32be',
+        b'\xff\xfe\x00\x00': 'utf-32le',
     }
 
     line_endings = {
-        'crlf': '\r\n',
-        'lf': '\n',
-        'cr': '\r',
+        'crlf': b'\r\n',
+        'lf': b'\n',
+        'cr': b'\r',
     }
     newlines = dict(zip(line_endings.values(), line_endings.keys()))
 
@@ -31,24 +73,29 @@ class EditorConfigChecker(EditorConfigToolObject):
 
     def __init__(self, fix=False):
         self.auto_fix = fix
+        self.error_flags = 0
         self.errors = set()
 
     def check_indentation(self, line, indent_style):
         """Return error string iff incorrect characters found in indentation"""
-        if indent_style == 'space' and '\t' in line:
-            self.errors.add("Tab indentation found")
-        elif indent_style == 'tab' and re.search('^(\s* \t+|^ +)', line):
-            self.errors.add("Space indentation found")
+        if indent_style == 'space' and b'\t' in line:
+            self.error_flags |= TAB_INDENTATION
+        elif indent_style == 'tab' and (
+                line[:1] == b' ' or
+                # The regex can only match when a space precedes a tab
+                b' \t' in line and _SPACE_INDENT_RE.search(line)):
+            self.error_flags |= SPACE_INDENTATION
         return line
 
     def check_charset(self, line, charset):
         """Return error string iff incorrect BOM found for expected charset"""
-        found_charset = None
         if charset in ('utf-8', 'latin1'):
             charset = None
-        for bom, given_charset in self.byte_order_marks.items():
-            if line.startswith(bom):
-                found_charset = given_charset
+        # BOMs are 2 to 4 characters long; try the longest prefix first so a
+        # utf-32le BOM isn't mistaken for the utf-16le one it starts with
+        boms = self.byte_order_marks
+        found_charset = (boms.get(line[:4]) or boms.get(line[:3]) or
+                         boms.get(line[:2]))
         if found_charset != charset:
             if not found_charset:
                 found_charset = "utf-8 or latin1"
@@ -59,98 +106,196 @@ class EditorConfigChecker(EditorConfigToolObject):
         """Return given final line with newline added/removed if necessary"""
         if not line:
             return line
-        has_final_newline = line[-1:] in ('\r', '\n')
+        has_final_newline = line[-1:] in (b'\r', b'\n')
         if (insert_final_newline in ('true', 'false') and
             insert_final_newline != str(has_final_newline).lower()):
             if has_final_newline:
-                self.errors.add("Final newline found")
+                self.error_flags |= FINAL_NEWLINE
             else:
-                self.errors.add("No final newline found")
+                self.error_flags |= NO_FINAL_NEWLINE
         if self.auto_fix:
             if insert_final_newline == 'true':
-                return re.sub(r'\r?\n?$', r'\n', line)
+                return _strip_newline(line) + b'\n'
             elif insert_final_newline == 'false':
-                return re.sub(r'\r?\n?$', '', line)
+                return _strip_newline(line)
         return line
 
     def check_trailing_whitespace(self, line, trim_trailing_whitespace):
         """Return line with whitespace trimmed if necessary"""
         if trim_trailing_whitespace == 'true':
-            new_line = re.sub(r'[ \t]*(\r?\n?)$', r'\1', line)
-            if new_line != line:
-                self.errors.add("Trailing whitespace found")
-            if self.auto_fix:
-                line = new_line
+            content = line.rstrip(b'\r\n')
+            stripped = content.rstrip(b' \t')
+            if len(stripped) != len(content):
+                self.error_flags |= TRAILING_WHITESPACE
+                if self.auto_fix:
+                    line = stripped + line[len(content):]
         return line
 
+    def get_settings(self, properties):
+        """Return CheckSettings of per-line checks for given properties"""
+        if properties.get('end_of_line') in self.line_endings:
+            end_of_line = properties['end_of_line']
+            newline = self.line_endings[end_of_line]
+        else:
+            end_of_line = None
+            newline = None
+        trim_whitespace = properties.get('trim_trailing_whitespace') == 'true'
+        indent_style = properties.get('indent_style')
+        check_indent_chars = indent_style is not None and (
+            indent_style == 'tab' or
+            'tab_width' in properties and
+            properties['indent_size'] == properties['tab_width'])
+        # Indentation can only be counted against a numeric indent_size
+        indent_size = properties.get('indent_size', '')
+        count_indent = indent_style == 'space' and indent_size.isdigit()
+        indent_size = int(indent_size) if count_indent else 0
+        return CheckSettings(
+            end_of_line, newline, trim_whitespace, indent_style,
+            check_indent_chars, count_indent, indent_size)
+
+    def write_lines(self, filename, lines):
+        """Replace contents of given file with given lines
+
+        Symbolic links are followed. The file is replaced atomically when
+        possible, otherwise it is rewritten in place.
+        """
+        filename = os.path.realpath(filename)
+        if not self.replace_file(filename, lines):
+            with open(filename, 'wb', WRITE_BUFFER_SIZE) as f:
+                f.writelines(lines)
+
+    def replace_file(self, filename, lines):
+        """Atomically replace given file by a new file holding given lines
+
+        Return False without touching the file if replacing it would lose
+        something: other hard links to it, or its owner.  Also return False
+        when the file isn't writable, since renaming over it only needs a
+        writable directory, or when no temporary file can be created next
+        to it.
+        """
+        if not os.access(filename, os.W_OK):
+            return False
+        stat = os.stat(filename)
+        if stat.st_nlink > 1:
+            return False
+        try:
+            fd, temp_filename = tempfile.mkstemp(
+                dir=os.path.dirname(filename))
+        except (IOError, OSError):
+            return False
+        try:
+            with os.fdopen(fd, 'wb', WRITE_BUFFER_SIZE) as f:
+                f.writelines(lines)
+            shutil.copymode(filename, temp_filename)
+            temp_stat = os.stat(temp_filename)
+            if ((temp_stat.st_uid, temp_stat.st_gid) !=
+                    (stat.st_uid, stat.st_gid)):
+                try:
+                    os.chown(temp_filename, stat.st_uid, stat.st_gid)
+                except (AttributeError, OSError):
+                    return False
+            _replace(temp_filename, filename)
+            return True
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
     def check(self, filename, properties):
 
         """Return error string list if file format doesn't match properties"""
 
-        # Error list, current line, correctly indented line count, line number
-        lines = []
-        line = None
-        correctly_indented = 0
-        lineno = 0
+        # Read the whole file in one go, keeping line endings on each line
+        with open(filename, 'rb') as f:
+            data = f.read()
+        lines = data.splitlines(True)
 
-        def handle_line(function, property_name):
-            """Add to error list if current line error for given function"""
-            if property_name in properties:
-                return function(line, properties[property_name])
-            else:
-                return line
+        line_count = len(lines)
+        incorrectly_indented = 0
 
-        open_opts = {'encoding': 'latin1'} if PY3 else {}
+        # Count line endings over the whole file; a CRLF also counts as
+        # one CR and one LF
+        found_newlines = set()
+        crlf_count = data.count(b'\r\n')
+        if crlf_count:
+            found_newlines.add(b'\r\n')
+        if data.count(b'\n') > crlf_count:
+            found_newlines.add(b'\n')
+        if data.count(b'\r') > crlf_count:
+            found_newlines.add(b'\r')
 
-        with open(filename, 'Ur+' if self.auto_fix else 'Ur', **open_opts) as f:
-            # Loop over file lines and append each error found to error list
-            if properties.get('end_of_line') in self.line_endings:
-                end_of_line = properties['end_of_line']
-                newline = self.line_endings[end_of_line]
-            else:
-                end_of_line = None
-                newline = None
-            for lineno, line in enumerate(f):
-                if end_of_line is None and f.newlines:
-                    newline = f.newlines[0]
-                if lineno == 0:
-                    handle_line(self.check_charset, 'charset')
-                line = handle_line(self.check_trailing_whitespace,
-                           'trim_trailing_whitespace')
-                if (properties.get('indent_style') == 'tab' or
-                    'indent_style' in properties and
-                    'tab_width' in properties and
-                    properties['indent_size'] == properties['tab_width']):
-                    line = handle_line(self.check_indentation, 'indent_style')
-                if properties.get('indent_style') == 'space':
-                    spaces = len(re.search('^ *', line).group(0))
-                    if (spaces <= 1 or
-                        spaces % int(properties['indent_size']) == 0):
-                        correctly_indented += 1
-                else:
-                    correctly_indented += 1
-                if self.auto_fix and newline:
-                    line = line.replace('\n', newline)
-                    lines.append(line)
-            if type(f.newlines) is tuple and end_of_line:
-                self.errors.add("Mixed line endings found: %s" %
-                                ','.join(self.newlines[n] for n in f.newlines))
-            elif (end_of_line is not None and f.newlines is not None and
-                  newline != f.newlines):
-                self.errors.add("Incorrect line ending found: %s" %
-                                self.newlines.get(f.newlines))
-            if lineno and float(correctly_indented) / (lineno + 1) < 0.70:
-                self.errors.add("Over 30% of lines appear to be incorrectly indented")
-            line = handle_line(self.check_final_newline,
-                               'insert_final_newline')
-            if self.auto_fix and line is not None:
-                if newline:
-                    line = line.replace('\n', newline)
-                lines[-1] = line
-            if self.auto_fix:
-                f.seek(0)
-                f.writelines(lines)
-                f.truncate()
-        errors = list(self.errors)
+        if lines and 'charset' in properties:
+            self.check_charset(lines[0], properties['charset'])
+
+        # Decide once which per-line checks apply to this file
+        settings = self.get_settings(properties)
+        end_of_line = settings.end_of_line
+        newline = settings.newline
+        trim_whitespace = settings.trim_whitespace
+        indent_style = settings.indent_style
+        check_indent_chars = settings.check_indent_chars
+        count_indent = settings.count_indent
+        indent_size = settings.indent_size
+        if newline is None and lines:
+            # Without end_of_line, keep the line ending of the first line
+            newline = lines[0][len(_strip_newline(lines[0])):] or None
+        auto_fix = self.auto_fix
+        fix_newlines = auto_fix and newline is not None
+        check_trailing_whitespace = self.check_trailing_whitespace
+        check_indentation = self.check_indentation
+
+        # Loop over file lines and append each error found to error list
+        for lineno, line in enumerate(lines):
+            if trim_whitespace:
+                line = check_trailing_whitespace(line, 'true')
+            if check_indent_chars:
+                check_indentation(line, indent_style)
+            if count_indent:
+                spaces = len(line) - len(line.lstrip(b' '))
+                if spaces > 1 and spaces % indent_size:
+                    incorrectly_indented += 1
+                    if (line_count > 1 and
+                        float(line_count - incorrectly_indented) /
+                            line_count < 0.70):
+                        self.error_flags |= INCORRECT_INDENTATION
+                        count_indent = False
+            if auto_fix:
+                if fix_newlines:
+                    content = _strip_newline(line)
+                    if len(content) != len(line):
+                        line = content + newline
+                lines[lineno] = line
+            elif self.error_flags:
+                # Stop running checks whose error was already found, and stop
+                # reading lines once no check is left
+                if self.error_flags & TRAILING_WHITESPACE:
+                    trim_whitespace = False
+                if self.error_flags & (TAB_INDENTATION | SPACE_INDENTATION):
+                    check_indent_chars = False
+                if not (trim_whitespace or check_indent_chars or
+                        count_indent):
+                    break
+        if end_of_line is not None and len(found_newlines) > 1:
+            self.errors.add("Mixed line endings found: %s" %
+                            ','.join(sorted(self.newlines[n]
+                                            for n in found_newlines)))
+        elif end_of_line is not None and found_newlines - set([newline]):
+            self.errors.add("Incorrect line ending found: %s" %
+                            self.newlines[found_newlines.pop()])
+        line = lines[-1] if lines else None
+        if 'insert_final_newline' in properties:
+            line = self.check_final_newline(line,
+                                            properties['insert_final_newline'])
+        if self.auto_fix and line is not None:
+            if (newline and line.endswith(b'\n') and
+                not line.endswith(newline)):
+                line = line[:-1] + newline
+            lines[-1] = line
+            # Leave files that need no fixing untouched
+            if b''.join(lines) != data:
+                self.write_lines(filename, lines)
+        errors = [message for flag, message in ERROR_MESSAGES
+                  if self.error_flags & flag]
+        errors.extend(self.errors)
+        self.error_flags = 0
         self.errors.clear()
         return errors
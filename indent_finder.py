@@ -9,7 +9,7 @@ from __future__ import absolute_import, division, print_function
 
 import math
 import sys
-import re
+from multiprocessing import Pool, cpu_count
 
 help = \
 """Usage : %s [ --verbose ] file1 file2 ... fileN
@@ -34,13 +34,22 @@ VERBOSE_DEEP_DEBUG = 3
 
 DEFAULT_VERBOSITY = VERBOSE_QUIET
 
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_MIN_FILES = 8
+
 
 class LineType:
-    NoIndent = 'NoIndent'
-    SpaceOnly = 'SpaceOnly'
-    TabOnly = 'TabOnly'
-    Mixed = 'Mixed'
-    BeginSpace = 'BeginSpace'
+    NoIndent = 0
+    SpaceOnly = 1
+    TabOnly = 2
+    Mixed = 3
+    BeginSpace = 4
+
+    names = ('NoIndent', 'SpaceOnly', 'TabOnly', 'Mixed', 'BeginSpace')
+
+
+# Line info of every line without indentation
+NO_INDENT_INFO = (LineType.NoIndent, b'', 0)
 
 
 def info(s):
@@ -110,9 +119,6 @@ class IndentFinder:
     mail, if possible with the offending file.
     """
 
-    INDENT_RE = re.compile("^([ \t]+)([^ \t]+)")
-    MIXED_RE = re.compile("^(\t+)( +)$")
-
     def __init__(self):
         self.clear()
 
@@ -123,17 +129,20 @@ class IndentFinder:
             self.parse_file(fname)
 
     def parse_file(self, fname):
-        with open(fname) as f:
-            for line in f:
-                self.analyse_line(line)
+        # Lines are analysed as bytes: only ASCII whitespace, comment and
+        # backslash characters are ever looked at
+        with open(fname, 'rb') as f:
+            lines = f.read().splitlines()
+        analyse_line = self.analyse_line
+        for line in lines:
+            analyse_line(line)
 
     def clear(self):
-        self.lines = {}
-        for i in range(2, 9):
-            self.lines['space%d' % i] = 0
-        for i in range(2, 9):
-            self.lines['mixed%d' % i] = 0
-        self.lines['tab'] = 0
+        # Line counts indexed by number of spaces of indentation increment,
+        # only indexes 2 to 8 are used
+        self.space = [0] * 9
+        self.mixed = [0] * 9
+        self.tab = 0
 
         self.nb_processed_lines = 0
         self.nb_indent_hint = 0
@@ -141,14 +150,14 @@ class IndentFinder:
         self.previous_line_info = None
 
     def analyse_line(self, line):
-        if line[-1:] == '\n':
-            line = line[:-1]
-        deepdbg('analyse_line: "%s"' % line.replace(' ', '.').replace('\t', '\\t'))
+        if self.VERBOSITY >= VERBOSE_DEEP_DEBUG:
+            # Lines are bytes: decode them for display only
+            deepdbg('analyse_line: "%s"' % line.decode('latin-1').replace(' ', '.').replace('\t', '\\t'))
         self.nb_processed_lines += 1
 
         skip_current_line = self.skip_next_line
         self.skip_next_line = False
-        if line[-1:] == '\\':
+        if line.endswith(b'\\'):
             deepdbg('analyse_line: Ignoring next line!')
             # skip lines after lines ending in \
             self.skip_next_line = True
@@ -157,74 +166,73 @@ class IndentFinder:
             deepdbg('analyse_line: Ignoring current line!')
             return
 
+        if not line.startswith((b' ', b'\t')):
+            # empty or not indented: no indentation hint, only remember the
+            # line for the next one
+            self.previous_line_info = NO_INDENT_INFO if line else None
+            return None
+
         ret = self.analyse_line_indentation(line)
         if ret:
             self.nb_indent_hint += 1
-        deepdbg('analyse_line: Result of line analysis: %s' % str(ret))
+        if self.VERBOSITY >= VERBOSE_DEEP_DEBUG:
+            deepdbg('analyse_line: Result of line analysis: %s' % str(ret))
         return ret
 
     def analyse_line_type(self, line):
         '''Analyse the type of line and return (LineType, <indentation part of
-        the line>).
+        the line>, <indentation length>), or (LineType.Mixed, <tab part>,
+        <space part>, <tab part length>, <space part length>).
 
         The function will reject improperly formatted lines (mixture of tab
         and space for example) and comment lines.
         '''
-        mixed_mode = False
-        tab_part = ''
-        space_part = ''
-
-        if len(line) > 0 and line[0] != ' ' and line[0] != '\t':
-            return (LineType.NoIndent, '')
+        if line and not line.startswith((b' ', b'\t')):
+            return NO_INDENT_INFO
 
-        mo = self.INDENT_RE.match(line)
-        if not mo:
+        text_part = line.lstrip(b' \t')
+        indent_len = len(line) - len(text_part)
+        if not indent_len or not text_part:
             deepdbg('analyse_line_type: line is not indented')
             return None
 
-        indent_part = mo.group(1)
-        text_part = mo.group(2)
+        indent_part = line[:indent_len]
 
-        deepdbg('analyse_line_type: indent_part="%s" text_part="%s"' %
-            (indent_part.replace(' ', '.').replace('\t', '\\t').replace('\n', '\\n'),
-                text_part))
+        if self.VERBOSITY >= VERBOSE_DEEP_DEBUG:
+            deepdbg('analyse_line_type: indent_part="%s" text_part="%s"' %
+                (indent_part.decode('latin-1').replace(' ', '.').replace('\t', '\\t'),
+                    text_part.decode('latin-1')))
 
-        if text_part[0] == '*':
+        if text_part.startswith(b'*'):
             # continuation of a C/C++ comment, unlikely to be indented correctly
             return None
 
-        if text_part[0:2] == '/*' or text_part[0] == '#':
+        if text_part.startswith((b'/*', b'#')):
             # python, C/C++ comment, might not be indented correctly
             return None
 
-        if '\t' in indent_part and ' ' in indent_part:
-            # mixed mode
-            mo = self.MIXED_RE.match(indent_part)
-            if not mo:
-                # line is not composed of '\t\t\t    ', ignore it
-                return None
-            mixed_mode = True
-            tab_part = mo.group(1)
-            space_part = mo.group(2)
-
-        if mixed_mode:
-            if len(space_part) >= 8:
-                # this is not mixed mode, this is garbage !
-                return None
-            return (LineType.Mixed, tab_part, space_part)
-
-        if '\t' in indent_part:
-            return (LineType.TabOnly, indent_part)
-
-        if ' ' in indent_part:
-            if len(indent_part) < 8:
+        tab_len = indent_part.count(b'\t')
+        if not tab_len:
+            if indent_len < 8:
                 # this could be mixed mode too
-                return (LineType.BeginSpace, indent_part)
+                return (LineType.BeginSpace, indent_part, indent_len)
             else:
                 # this is really a line indented with spaces
-                return (LineType.SpaceOnly, indent_part)
+                return (LineType.SpaceOnly, indent_part, indent_len)
+
+        if tab_len == indent_len:
+            return (LineType.TabOnly, indent_part, indent_len)
 
-        assert False, 'We should never get there !'
+        # mixed mode: all the tabs have to come first
+        if indent_part.rfind(b'\t') != tab_len - 1:
+            # line is not composed of '\t\t\t    ', ignore it
+            return None
+        space_len = indent_len - tab_len
+        if space_len >= 8:
+            # this is not mixed mode, this is garbage !
+            return None
+        return (LineType.Mixed, indent_part[:tab_len], indent_part[tab_len:],
+                tab_len, space_len)
 
     def analyse_line_indentation(self, line):
         previous_line_info = self.previous_line_info
@@ -232,79 +240,104 @@ class IndentFinder:
         self.previous_line_info = current_line_info
 
         if current_line_info is None or previous_line_info is None:
-            deepdbg('analyse_line_indentation: Not enough line info to analyse line: %s, %s' % (str(previous_line_info), str(current_line_info)))
+            if self.VERBOSITY >= VERBOSE_DEEP_DEBUG:
+                deepdbg('analyse_line_indentation: Not enough line info to analyse line: %s, %s' % (str(previous_line_info), str(current_line_info)))
             return
 
-        t = (previous_line_info[0], current_line_info[0])
-        deepdbg('analyse_line_indentation: Indent analysis: %s %s' % t)
-        if (t == (LineType.TabOnly, LineType.TabOnly)
-            or t == (LineType.NoIndent, LineType.TabOnly)):
-            if len(current_line_info[1]) - len(previous_line_info[1]) == 1:
-                self.lines['tab'] += 1
-                return 'tab'
-
-        elif (t == (LineType.SpaceOnly, LineType.SpaceOnly)
-              or t == (LineType.BeginSpace, LineType.SpaceOnly)
-              or t == (LineType.NoIndent, LineType.SpaceOnly)):
-            nb_space = len(current_line_info[1]) - len(previous_line_info[1])
+        prev_type = previous_line_info[0]
+        curr_type = current_line_info[0]
+        if self.VERBOSITY >= VERBOSE_DEEP_DEBUG:
+            deepdbg('analyse_line_indentation: Indent analysis: %s %s' %
+                    (LineType.names[prev_type], LineType.names[curr_type]))
+        handler = self.transitions[prev_type][curr_type]
+        if handler is None:
+            return None
+        return handler(self, previous_line_info, current_line_info)
+
+    def tab_indent(self, previous_line_info, current_line_info):
+        if current_line_info[2] - previous_line_info[2] == 1:
+            self.tab += 1
+            return 'tab'
+
+    def space_indent(self, previous_line_info, current_line_info):
+        nb_space = current_line_info[2] - previous_line_info[2]
+        if 1 < nb_space <= 8:
+            self.space[nb_space] += 1
+            return 'space'
+
+    def space_or_mixed_indent(self, previous_line_info, current_line_info):
+        nb_space = current_line_info[2] - previous_line_info[2]
+        if 1 < nb_space <= 8:
+            self.space[nb_space] += 1
+            self.mixed[nb_space] += 1
+            return 'space'
+
+    def tab_after_space_indent(self, previous_line_info, current_line_info):
+        # we assume that mixed indentation used 8 characters tabs
+        if current_line_info[2] == 1:
+            # more than one tab on the line --> not mixed mode !
+            nb_space = 8 - previous_line_info[2]
             if 1 < nb_space <= 8:
-                key = 'space%d' % nb_space
-                self.lines[key] += 1
-                return key
+                self.mixed[nb_space] += 1
+                return 'mixed'
 
-        elif (t == (LineType.BeginSpace, LineType.BeginSpace)
-              or t == (LineType.NoIndent, LineType.BeginSpace)):
-            nb_space = len(current_line_info[1]) - len(previous_line_info[1])
+    def mixed_after_tab_indent(self, previous_line_info, current_line_info):
+        if previous_line_info[2] == current_line_info[3]:
+            nb_space = current_line_info[4]
             if 1 < nb_space <= 8:
-                key1 = 'space%d' % nb_space
-                key2 = 'mixed%d' % nb_space
-                self.lines[key1] += 1
-                self.lines[key2] += 1
-                return key1
-
-        elif t == (LineType.BeginSpace, LineType.TabOnly):
-            # we assume that mixed indentation used 8 characters tabs
-            if len(current_line_info[1]) == 1:
-                # more than one tab on the line --> not mixed mode !
-                nb_space = len(current_line_info[1]) * 8 - len(previous_line_info[1])
-                if 1 < nb_space <= 8:
-                    key = 'mixed%d' % nb_space
-                    self.lines[key] += 1
-                    return key
-
-        elif t == (LineType.TabOnly, LineType.Mixed):
-            tab_part, space_part = tuple(current_line_info[1:3])
-            if len(previous_line_info[1]) == len(tab_part):
-                nb_space = len(space_part)
-                if 1 < nb_space <= 8:
-                    key = 'mixed%d' % nb_space
-                    self.lines[key] += 1
-                    return key
-
-        elif t == (LineType.Mixed, LineType.TabOnly):
-            tab_part, space_part = previous_line_info[1:3]
-            if len(tab_part) + 1 == len(current_line_info[1]):
-                nb_space = 8 - len(space_part)
-                if 1 < nb_space <= 8:
-                    key = 'mixed%d' % nb_space
-                    self.lines[key] += 1
-                    return key
-        else:
-            pass
+                self.mixed[nb_space] += 1
+                return 'mixed'
 
-        return None
+    def tab_after_mixed_indent(self, previous_line_info, current_line_info):
+        if previous_line_info[3] + 1 == current_line_info[2]:
+            nb_space = 8 - previous_line_info[4]
+            if 1 < nb_space <= 8:
+                self.mixed[nb_space] += 1
+                return 'mixed'
+
+    # Indentation handler for each valid (previous, current) pair of line
+    # types, indexed as transitions[previous][current]
+    transitions = [[None] * len(LineType.names) for i in LineType.names]
+    transitions[LineType.NoIndent][LineType.TabOnly] = tab_indent
+    transitions[LineType.TabOnly][LineType.TabOnly] = tab_indent
+    transitions[LineType.NoIndent][LineType.SpaceOnly] = space_indent
+    transitions[LineType.BeginSpace][LineType.SpaceOnly] = space_indent
+    transitions[LineType.SpaceOnly][LineType.SpaceOnly] = space_indent
+    transitions[LineType.NoIndent][LineType.BeginSpace] = space_or_mixed_indent
+    transitions[LineType.BeginSpace][LineType.BeginSpace] = space_or_mixed_indent
+    transitions[LineType.BeginSpace][LineType.TabOnly] = tab_after_space_indent
+    transitions[LineType.TabOnly][LineType.Mixed] = mixed_after_tab_indent
+    transitions[LineType.Mixed][LineType.TabOnly] = tab_after_mixed_indent
+
+    def most_used_indent(self, lines):
+        """Return the most used indentation increment in given line counts
+
+        A smaller increment only wins if it is used over 10% more than a
+        larger one. Return None if all counts are zero.
+        """
+        nb = 0
+        indent_value = None
+        for i in range(8, 1, -1):
+            if lines[i] > int(nb * 1.1):  # give a 10% threshold
+                indent_value = i
+                nb = lines[indent_value]
+                dbg("%d confidence: %d" % (indent_value, math.log(nb)))
+        return indent_value
 
     def results(self):
         dbg("Nb of scanned lines : %d" % self.nb_processed_lines)
         dbg("Nb of indent hint : %d" % self.nb_indent_hint)
         dbg("Collected data:")
-        for key in self.lines:
-            if self.lines[key] > 0:
-                dbg('%s: %d' % (key, self.lines[key]))
+        for name, lines in (('space', self.space), ('mixed', self.mixed)):
+            for i in range(2, 9):
+                if lines[i] > 0:
+                    dbg('%s%d: %d' % (name, i, lines[i]))
+        if self.tab > 0:
+            dbg('tab: %d' % self.tab)
 
-        max_line_space = max([self.lines['space%d' % i] for i in range(2, 9)])
-        max_line_mixed = max([self.lines['mixed%d' % i] for i in range(2, 9)])
-        max_line_tab = self.lines['tab']
+        max_line_space = max(self.space[2:9])
+        max_line_mixed = max(self.mixed[2:9])
+        max_line_tab = self.tab
 
         dbg('max_line_space: %d' % max_line_space)
         dbg('max_line_mixed: %d' % max_line_mixed)
@@ -351,14 +384,7 @@ class IndentFinder:
 
         # Detect space indented file
         if max_line_space >= max_line_mixed and max_line_space > max_line_tab:
-            nb = 0
-            indent_value = None
-            for i in range(8, 1, -1):
-                if self.lines['space%d' % i] > int(nb * 1.1):  # give a 10% threshold
-                    indent_value = i
-                    nb = self.lines['space%d' % indent_value]
-                    dbg("%d confidence: %d" % (indent_value, math.log(nb)))
-
+            indent_value = self.most_used_indent(self.space)
             if indent_value is not None:  # no lines
                 result = ('space', indent_value)
 
@@ -368,13 +394,7 @@ class IndentFinder:
 
         # Detect mixed files
         elif max_line_mixed >= max_line_tab and max_line_mixed > max_line_space:
-            nb = 0
-            indent_value = None
-            for i in range(8, 1, -1):
-                if self.lines['mixed%d' % i] > int(nb * 1.1):  # give a 10% threshold
-                    indent_value = i
-                    nb = self.lines['mixed%d' % indent_value]
-
+            indent_value = self.most_used_indent(self.mixed)
             if indent_value is not None:  # no lines
                 result = ('mixed', (8, indent_value))
 
@@ -391,6 +411,13 @@ class IndentFinder:
             return '%s tab %d space %d' % (itype, itab, ispace)
 
 
+def describe_file(fname):
+    """Return line describing the indentation used in given file"""
+    fi = IndentFinder()
+    fi.parse_file(fname)
+    return "%s : %s" % (fname, str(fi))
+
+
 def main():
     file_list = []
     for opt in sys.argv[1:]:
@@ -402,18 +429,27 @@ def main():
         else:
             file_list.append(opt)
 
-    fi = IndentFinder()
-
     if len(file_list) > 1:
-        # multiple files
-        for fname in file_list:
-            fi.clear()
-            fi.parse_file(fname)
-            print("%s : %s" % (fname, str(fi)))
+        # multiple files, scanned in parallel unless there are few of them
+        # or debug output of each file has to stay together
+        if (len(file_list) < PARALLEL_MIN_FILES or
+                IndentFinder.VERBOSITY > VERBOSE_QUIET):
+            for description in map(describe_file, file_list):
+                print(description)
+            return
+        pool = Pool(min(len(file_list), cpu_count()))
+        try:
+            for description in pool.imap(describe_file, file_list):
+                print(description)
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
         return
 
     else:
         # only one file, don't print filename
+        fi = IndentFinder()
         fi.parse_file_list(file_list)
         print(str(fi))
 
@@ -1,9 +1,17 @@
 #!/usr/bin/env python
+import os
+import shutil
+import sys
+from multiprocessing import Pool
+from tempfile import mkdtemp, mkstemp
 from unittest import TestCase, main
 from os.path import abspath
 
 from editorconfig import get_properties
+from editorconfig_tools import check_editorconfig
+from editorconfig_tools.check_editorconfig import check_file
 from editorconfig_tools.editorconfig_tools import EditorConfigChecker
+from indent_finder import IndentFinder
 
 
 def get_filename(test_file):
@@ -56,6 +64,11 @@ class LineEndingTests(EditorConfigTestCase):
             "No final newline found",
         ])
 
+    def test_mixed(self):
+        self.assertFileErrors('lf_invalid_mixed.txt', [
+            "Mixed line endings found: crlf,lf",
+        ])
+
     def test_empty_file(self):
         self.assertFileErrors('lf_empty.txt', [])
 
@@ -128,6 +141,9 @@ class CharsetTests(EditorConfigTestCase):
         self.assertFileErrors('utf-16le_invalid_latin1.txt', [
             "Charset utf-8 or latin1 found",
         ])
+        self.assertFileErrors('utf-16le_invalid_utf-32le.txt', [
+            "Charset utf-32le found",
+        ])
 
 
 class TrailingWhitespaceTest(EditorConfigTestCase):
@@ -170,6 +186,205 @@ class IndentationTest(EditorConfigTestCase):
             'Space indentation found'
         ])
 
+    def test_space_indentation_without_size(self):
+        fd, filename = mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+        checker = EditorConfigChecker()
+        for indent_size in (None, 'tab'):
+            props = {'indent_style': 'space'}
+            if indent_size is not None:
+                props['indent_size'] = indent_size
+            self.assertEqual(checker.check(filename, props), [])
+
+
+class FixTests(TestCase):
+
+    """Tests for EditorConfigChecker with automatic fixing enabled"""
+
+    def assertFixed(self, contents, properties, expected_contents):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contents)
+        EditorConfigChecker(fix=True).check(filename, properties)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), expected_contents)
+
+    def test_file_mode_kept(self):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'a \n')
+        os.chmod(filename, 0o640)
+        props = {'trim_trailing_whitespace': 'true'}
+        EditorConfigChecker(fix=True).check(filename, props)
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o640)
+
+    def test_read_only_file_not_fixed(self):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'a \n')
+        os.chmod(filename, 0o444)
+        if os.access(filename, os.W_OK):
+            self.skipTest("read-only files are writable by this user")
+        props = {'trim_trailing_whitespace': 'true'}
+        checker = EditorConfigChecker(fix=True)
+        self.assertRaises(EnvironmentError, checker.check, filename, props)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'a \n')
+
+    def test_unchanged_file_kept(self):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'a\nb\n')
+        inode = os.stat(filename).st_ino
+        props = {'end_of_line': 'lf', 'trim_trailing_whitespace': 'true'}
+        self.assertEqual(EditorConfigChecker(fix=True).check(filename, props),
+                         [])
+        self.assertEqual(os.stat(filename).st_ino, inode)
+
+    def make_file(self, contents):
+        directory = mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'real.txt')
+        with open(filename, 'wb') as f:
+            f.write(contents)
+        return filename
+
+    def test_symlink_kept(self):
+        if not hasattr(os, 'symlink'):
+            self.skipTest("symbolic links not supported")
+        filename = self.make_file(b'a  \n')
+        link = os.path.join(os.path.dirname(filename), 'link.txt')
+        os.symlink(filename, link)
+        props = {'trim_trailing_whitespace': 'true'}
+        EditorConfigChecker(fix=True).check(link, props)
+        self.assertTrue(os.path.islink(link))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'a\n')
+
+    def test_hard_link_kept(self):
+        if not hasattr(os, 'link'):
+            self.skipTest("hard links not supported")
+        filename = self.make_file(b'a  \n')
+        link = os.path.join(os.path.dirname(filename), 'link.txt')
+        os.link(filename, link)
+        props = {'trim_trailing_whitespace': 'true'}
+        EditorConfigChecker(fix=True).check(link, props)
+        self.assertEqual(os.stat(filename).st_nlink, 2)
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'a\n')
+
+    def test_insert_final_newline(self):
+        props = {'insert_final_newline': 'true'}
+        self.assertFixed(b'a\nb', props, b'a\nb\n')
+        self.assertFixed(b'a\nb\n', props, b'a\nb\n')
+        props['end_of_line'] = 'crlf'
+        self.assertFixed(b'a\r\nb', props, b'a\r\nb\r\n')
+        self.assertFixed(b'a\r\nb\r\n', props, b'a\r\nb\r\n')
+
+    def test_remove_final_newline(self):
+        props = {'insert_final_newline': 'false'}
+        self.assertFixed(b'a\nb\n', props, b'a\nb')
+        self.assertFixed(b'a\r\nb\r\n', props, b'a\r\nb')
+        self.assertFixed(b'a\nb', props, b'a\nb')
+
+    def test_end_of_line(self):
+        props = {'end_of_line': 'lf'}
+        self.assertFixed(b'a\r\nb\rc\n', props, b'a\nb\nc\n')
+        props['end_of_line'] = 'crlf'
+        self.assertFixed(b'a\r\nb\rc\n', props, b'a\r\nb\r\nc\r\n')
+        props['end_of_line'] = 'cr'
+        self.assertFixed(b'a\r\nb\rc', props, b'a\rb\rc')
+
+
+class CheckFileTests(TestCase):
+
+    """Tests for check_editorconfig file checking, serial and parallel"""
+
+    filenames = [get_filename('lf_invalid_crlf.txt'),
+                 get_filename('trim_invalid1.txt'),
+                 get_filename('lf_valid.txt')]
+
+    def run_main(self, *args):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        # clint reads the sys.argv list itself, so change it in place
+        argv, stdout = sys.argv[:], sys.stdout
+        sys.argv[:] = ['check_editorconfig'] + list(args)
+        try:
+            with os.fdopen(fd, 'w') as sys.stdout:
+                check_editorconfig.main()
+        finally:
+            sys.argv[:], sys.stdout = argv, stdout
+        with open(filename) as f:
+            return f.read().splitlines()
+
+    def test_check_file(self):
+        filename = self.filenames[0]
+        props = get_properties(filename)
+        errors = EditorConfigChecker().check(filename, props)
+        self.assertEqual(
+            check_file(filename),
+            ["%s: %s" % (filename, error) for error in errors])
+        pool = Pool(2)
+        self.addCleanup(pool.terminate)
+        self.assertEqual(pool.map(check_file, self.filenames),
+                         list(map(check_file, self.filenames)))
+
+    def test_jobs(self):
+        serial = self.run_main(*self.filenames)
+        self.assertTrue(serial)
+        self.assertEqual(self.run_main('--jobs', '2', *self.filenames),
+                         serial)
+
+
+class IndentFinderTests(TestCase):
+
+    """Tests for IndentFinder indentation detection"""
+
+    def assertIndentation(self, contents, expected):
+        fd, filename = mkstemp()
+        self.addCleanup(os.remove, filename)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(contents)
+        finder = IndentFinder()
+        finder.parse_file(filename)
+        self.assertEqual(str(finder), expected)
+
+    def test_empty(self):
+        self.assertIndentation(b'', 'None 0')
+
+    def test_space(self):
+        self.assertIndentation(b'a\n  b\n    c\n  d\ne\n' * 3, 'space 2')
+        self.assertIndentation(b'a\n    b\n        c\n    d\ne\n' * 3,
+                               'space 4')
+
+    def test_tab(self):
+        self.assertIndentation(b'a\n\tb\n\t\tc\n\td\ne\n' * 3, 'tab 0')
+
+    def test_mixed(self):
+        contents = b'a\n    b\n\tc\n\t    d\n\t\te\n\t    f\n\tg\n    h\ni\n'
+        self.assertIndentation(contents * 3, 'mixed tab 8 space 4')
+
+    def test_comment_skipped(self):
+        # Counting comment lines would make this look indented by 2
+        self.assertIndentation(b'a\n    b\n      * c\n    d\n      * e\n' * 3,
+                               'space 4')
+
+    def test_continuation_skipped(self):
+        # Counting continued lines would make this look indented by 2
+        self.assertIndentation(b'a\n    b \\\n      c \\\n        d\n' * 3,
+                               'space 4')
+
+    def test_line_endings(self):
+        contents = b'a\n  b\n    c\n  d\ne\n' * 3
+        self.assertIndentation(contents.replace(b'\n', b'\r'), 'space 2')
+        self.assertIndentation(contents.replace(b'\n', b'\r\n'), 'space 2')
+
 
 if __name__ == "__main__":
     main()